@@ -62,6 +62,35 @@ class Chip(object):
         self.wait_for_input = False
         self.has_exit = False
 
+        # Optional sound.Beeper, only told when the sound timer turns on/off
+        self.beeper = None
+
+        # Optional shared.SharedState backing display_buffer and registers
+        self.shared = None
+
+        # Optional recorder.Recorder, given every presented frame
+        self.recorder = None
+
+    def share(self, name=None):
+        # Move display_buffer and registers into shared memory for other
+        # processes to read. Returns the segment name.
+        from shared import SharedState
+
+        self.shared = SharedState(Chip.SCREEN_WIDTH, Chip.SCREEN_HEIGHT, name=name)
+        self.shared.display_buffer[:] = self.display_buffer
+        self.shared.registers[:] = self.registers
+        self.display_buffer = self.shared.display_buffer
+        self.registers = self.shared.registers
+        return self.shared.name
+
+    def unshare(self):
+        # Take private copies so nothing points into the segment, then close it
+        self.display_buffer = self.display_buffer.copy()
+        self.registers = self.registers.copy()
+
+        shared, self.shared = self.shared, None
+        shared.close()
+
 # Loading data into memory
     def load(self, rom_filename):
         print('Loading...', end=' - ')
@@ -108,6 +137,8 @@ class Chip(object):
 
         if self.sound_timer > 0:
             self.sound_timer -= 1
+            if self.sound_timer == 0 and self.beeper:
+                self.beeper.stop()
 
 
     def update(self):
@@ -117,6 +148,9 @@ class Chip(object):
             if self.has_exit or self.wait_for_input:
                 break
 
+        if self.should_draw and self.recorder:
+            self.recorder.push(self.display_buffer)
+
     def dispatch_events(self):
         pass
 
@@ -241,7 +275,15 @@ class Chip(object):
     # Opcode implementations #
     @instruction
     def _cls(self):
-        self.display_buffer = np.zeros((64, 32), dtype=np.uint8)
+        if self.shared:
+            self.shared.begin_frame()
+
+        # Clear in place, display_buffer may be a view into shared memory
+        try:
+            self.display_buffer.fill(0)
+        finally:
+            if self.shared:
+                self.shared.end_frame(self)
 
     @instruction
     def _ret(self):
@@ -353,29 +395,35 @@ class Chip(object):
     @instruction
     def _drw(self, x, y, n):
         flag_val = False
+        if self.shared:
+            self.shared.begin_frame()
 
         def is_bit_set(byte, shift):
             return ((0x80 >> shift) & byte) >> (7 - shift)
 
-        for y_offset in range(n):
-            sprite_byte = self.memory[self.index + y_offset]
+        try:
+            for y_offset in range(n):
+                sprite_byte = self.memory[self.index + y_offset]
 
-            for x_offset in range(8):
-                x_coordinate = (self.registers[x] + x_offset) % Chip.SCREEN_WIDTH
-                y_coordinate = (self.registers[y] + y_offset) % Chip.SCREEN_HEIGHT
+                for x_offset in range(8):
+                    x_coordinate = (self.registers[x] + x_offset) % Chip.SCREEN_WIDTH
+                    y_coordinate = (self.registers[y] + y_offset) % Chip.SCREEN_HEIGHT
 
-                # Because pyglet considers (0, 0) as bottom-left
-                y_coordinate = Chip.SCREEN_HEIGHT - y_coordinate - 1
+                    # Because pyglet considers (0, 0) as bottom-left
+                    y_coordinate = Chip.SCREEN_HEIGHT - y_coordinate - 1
 
-                sprite_val = is_bit_set(sprite_byte, x_offset)
+                    sprite_val = is_bit_set(sprite_byte, x_offset)
 
-                if self.display_buffer[x_coordinate, y_coordinate] and sprite_val:
-                    flag_val = True
+                    if self.display_buffer[x_coordinate, y_coordinate] and sprite_val:
+                        flag_val = True
 
-                self.display_buffer[x_coordinate, y_coordinate] ^= sprite_val
+                    self.display_buffer[x_coordinate, y_coordinate] ^= sprite_val
 
-        self._set_flag(flag_val)
-        self.should_draw = True
+            self._set_flag(flag_val)
+            self.should_draw = True
+        finally:
+            if self.shared:
+                self.shared.end_frame(self)
 
     @instruction
     def _sys(self, addr):
@@ -417,7 +465,15 @@ class Chip(object):
                 self.delay_timer = self.registers[dest]
 
         elif mode == 'SOUND':
-            self.registers[src] = self.sound_timer
+            was_silent = self.sound_timer == 0
+            self.sound_timer = self.registers[dest]
+
+            if self.beeper:
+                # Timers tick per instruction, so ask for the 60Hz length
+                if self.sound_timer > 0:
+                    self.beeper.start(self.sound_timer / 60)
+                elif not was_silent:
+                    self.beeper.stop()
 
         elif mode == 'SPRITE':
             self.index = 5 * self.registers[dest]
@@ -0,0 +1,232 @@
+"""
+Lockstep differential testing between two execution engines
+
+Runs two engines on the same ROM, seed and input script and reports the first
+instruction where their state differs. An engine is anything built like Chip:
+load(), cycle() and the same state attributes. Only the reference engine needs
+Chip's opcode_map, which is used to disassemble both sides. Both default to
+chip:Chip, so a new backend is checked with
+
+    python lockstep.py --engine mymodule:FastChip
+
+Engines run a chunk of instructions at a time, recording a cheap hash of their
+state after every instruction. Only when the hashes disagree are both rewound
+to the start of the chunk and replayed to take a full diff.
+"""
+
+from __future__ import print_function, division
+import argparse
+import contextlib
+import glob
+import importlib
+import io
+import os
+import struct
+import sys
+import time
+import zlib
+import numpy as np
+from multiprocessing import Pool
+
+ARRAYS = ('memory', 'registers', 'display_buffer', 'key_inputs')
+SCALARS = ('pc', 'index', 'delay_timer', 'sound_timer', 'should_draw', 'wait_for_input')
+
+
+def load_engine(spec):
+    module, name = spec.split(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def load_script(filename):
+    # Each line is '<step> <key> <0|1>', applied before that instruction runs
+    events = {}
+    with open(filename) as script:
+        for line in script:
+            line = line.split('#')[0].split()
+            if line:
+                step, key, value = (int(part, 0) for part in line)
+                events.setdefault(step, []).append((key, value))
+    return events
+
+
+def state_hash(emu):
+    value = zlib.crc32(emu.memory.data)
+    value = zlib.crc32(emu.registers.data, value)
+    value = zlib.crc32(emu.display_buffer.data, value)
+    value = zlib.crc32(struct.pack('<HHBB%dH' % len(emu.stack),
+        int(emu.pc) & 0xffff, int(emu.index) & 0xffff,
+        int(emu.delay_timer), int(emu.sound_timer),
+        *(int(addr) & 0xffff for addr in emu.stack)), value)
+    return value
+
+
+def snapshot(emu):
+    state = {name: getattr(emu, name).copy() for name in ARRAYS}
+    state.update((name, getattr(emu, name)) for name in SCALARS)
+    state['stack'] = list(emu.stack)
+    return state
+
+
+def restore(emu, state):
+    # Arrays are written in place, they may be shared with something else
+    for name in ARRAYS:
+        getattr(emu, name)[...] = state[name]
+    for name in SCALARS:
+        setattr(emu, name, state[name])
+    emu.stack = list(state['stack'])
+
+
+def describe(emu, opcode_map):
+    # Disassembled with the reference engine's opcode_map, since other engines
+    # needn't have one
+    opcode = int(emu.memory[emu.pc]) << 8
+    opcode |= int(emu.memory[emu.pc + 1])
+    instruction = opcode_map.get(opcode)
+    name = instruction.__name__ if instruction else 'unknown'
+    return "0x{0:04x}: 0x{1:04x} - {2}".format(int(emu.pc), opcode, name)
+
+
+def diff(a, b):
+    lines = []
+    for name in SCALARS + ('stack',):
+        val_a, val_b = getattr(a, name), getattr(b, name)
+        if name == 'stack':
+            val_a, val_b = [int(v) for v in val_a], [int(v) for v in val_b]
+        else:
+            val_a, val_b = int(val_a), int(val_b)
+        if val_a != val_b:
+            lines.append("{0}: {1} != {2}".format(name, val_a, val_b))
+
+    for name in ARRAYS:
+        arr_a, arr_b = getattr(a, name), getattr(b, name)
+        differ = np.argwhere(arr_a != arr_b)
+        for index in differ[:8]:
+            index = tuple(index)
+            lines.append("{0}[{1}]: {2} != {3}".format(name,
+                ", ".join(hex(i) for i in index), arr_a[index], arr_b[index]))
+        if len(differ) > 8:
+            lines.append("{0}: {1} more differences".format(name, len(differ) - 8))
+    return lines
+
+
+class Runner(object):
+    # One engine plus its own random number stream
+    def __init__(self, engine, rom, seed):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.emu = engine()
+            self.emu.load(rom)
+        np.random.seed(seed)
+        self.rng = np.random.get_state()
+
+    def run(self, start, count, events, hashes=True):
+        # Returns the hash after each instruction and the error that halted
+        # the engine, if any
+        emu = self.emu
+        results = []
+        error = None
+
+        np.random.set_state(self.rng)
+        for step in range(start, start + count):
+            for key, value in events.get(step, ()):
+                emu.key_inputs[key] = value
+            try:
+                emu.cycle()
+            except Exception as e:
+                error = repr(e)
+                break
+            if hashes:
+                results.append(state_hash(emu))
+        self.rng = np.random.get_state()
+        return results, error
+
+    def checkpoint(self):
+        return snapshot(self.emu), self.rng
+
+    def rewind(self, checkpoint):
+        state, self.rng = checkpoint
+        restore(self.emu, state)
+
+
+def compare(rom, engine_a, engine_b, steps, seed=0, events=None, chunk=10000):
+    events = events or {}
+    a = Runner(engine_a, rom, seed)
+    b = Runner(engine_b, rom, seed)
+    began = time.perf_counter()
+
+    step = 0
+    while step < steps:
+        count = min(chunk, steps - step)
+        checkpoints = a.checkpoint(), b.checkpoint()
+        hashes_a, error_a = a.run(step, count, events)
+        hashes_b, error_b = b.run(step, count, events)
+
+        if hashes_a == hashes_b and error_a == error_b:
+            if error_a:
+                return rom, 'halted', step + len(hashes_a), [error_a], \
+                        time.perf_counter() - began
+            step += count
+            continue
+
+        # Find the first instruction where the two disagree
+        first = next((i for i, (x, y) in enumerate(zip(hashes_a, hashes_b))
+            if x != y), min(len(hashes_a), len(hashes_b)))
+
+        a.rewind(checkpoints[0])
+        b.rewind(checkpoints[1])
+        a.run(step, first, events, hashes=False)
+        b.run(step, first, events, hashes=False)
+
+        opcode_map = a.emu.opcode_map
+        report = ["A " + describe(a.emu, opcode_map), "B " + describe(b.emu, opcode_map)]
+        _, error_a = a.run(step + first, 1, events, hashes=False)
+        _, error_b = b.run(step + first, 1, events, hashes=False)
+        if error_a != error_b:
+            report.append("error: {0} != {1}".format(error_a, error_b))
+        report.extend(diff(a.emu, b.emu))
+        return rom, 'diverged', step + first, report, time.perf_counter() - began
+
+    return rom, 'ok', steps, [], time.perf_counter() - began
+
+
+def _compare(job):
+    rom, args = job
+    events = load_script(args.input) if args.input else None
+    return compare(rom, load_engine(args.reference), load_engine(args.engine),
+            args.steps, args.seed, events, args.chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filenames', nargs='*',
+            help='Locations of CHIP-8 ROMs (default: everything in roms/)')
+    parser.add_argument('-r', '--reference', default='chip:Chip',
+            help='Reference engine as module:Class')
+    parser.add_argument('-e', '--engine', default='chip:Chip',
+            help='Engine under test as module:Class')
+    parser.add_argument('-n', '--steps', type=int, default=1000000,
+            help='Instructions to run per ROM')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-i', '--input', help='Input script of <step> <key> <0|1> lines')
+    parser.add_argument('-c', '--chunk', type=int, default=10000,
+            help='Instructions to run between hash comparisons')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+            help='ROMs to check in parallel')
+    args = parser.parse_args()
+
+    roms = args.filenames or sorted(glob.glob(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roms', '*.ch8')))
+
+    failed = False
+    with Pool(args.jobs) as pool:
+        for rom, status, step, report, seconds in pool.imap(_compare,
+                [(rom, args) for rom in roms]):
+            print("{0:8} {1} after {2} instructions ({3:.1f}s)".format(
+                status, os.path.basename(rom), step, seconds))
+            for line in report:
+                print("    " + line)
+            failed = failed or status == 'diverged'
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
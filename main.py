@@ -1,6 +1,24 @@
 import sys
 import argparse
+from recorder import Recorder
+
+parser = argparse.ArgumentParser()
+parser.add_argument('filename', help='Location of CHIP-8 ROM')
+parser.add_argument('-d', '--debug', help='debug mode', action='store_true')
+parser.add_argument('-m', '--mute', help='disable sound', action='store_true')
+parser.add_argument('--wav', help='write sound to a WAV file instead of playing it')
+parser.add_argument('--share', metavar='NAME', nargs='?', const='',
+        help='export the display and registers through shared memory')
+parser.add_argument('--record', metavar='FILE',
+        help='record frames to a .gif, .apng or .raw file')
+args = parser.parse_args()
+
+# The recorder forks its encoder, so start it before pyglet opens a window or
+# audio player for the child to inherit. Importing chip is enough to do that.
+recorder = Recorder(args.record) if args.record else None
+
 from chip import Chip
+from sound import Beeper, PygletSink, WaveSink
 
 import pyglet
 from pyglet.window import key, FPSDisplay
@@ -10,6 +28,7 @@ from pyglet.window import key, FPSDisplay
 ################################
 
 chip = Chip()
+chip.recorder = recorder
 window = pyglet.window.Window()
 fps_display = FPSDisplay(window)
 
@@ -58,12 +77,31 @@ def draw_rect(x, y, dx, dy):
                     x+dx, y+dy,
                     x, y+dy)))
 
-parser = argparse.ArgumentParser()
-parser.add_argument('filename', help='Location of CHIP-8 ROM')
-parser.add_argument('-d', '--debug', help='debug mode', action='store_true')
-args = parser.parse_args()
 Chip.DEBUG = args.debug
 
+if args.wav:
+    chip.beeper = Beeper(WaveSink(args.wav))
+elif not args.mute:
+    chip.beeper = Beeper(PygletSink())
+
+if args.share is not None:
+    print('Sharing state as', chip.share(args.share or None))
+
 pyglet.clock.schedule_interval(update, 1/20.)
 chip.load(args.filename)
-pyglet.app.run()
+try:
+    pyglet.app.run()
+finally:
+    # Tear down each output even if an earlier one fails
+    try:
+        if chip.beeper:
+            chip.beeper.close()
+            print(chip.beeper.report())
+    finally:
+        try:
+            if chip.shared:
+                chip.unshare()
+        finally:
+            if chip.recorder:
+                chip.recorder.close()
+                print(chip.recorder.report())
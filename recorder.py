@@ -0,0 +1,306 @@
+"""
+Records presented frames to an animated GIF, an APNG or a run-length stream
+
+Chip.update hands every presented frame to Recorder.push, which only copies
+the display buffer into a bounded queue. A worker process drops repeated
+frames and does all of the encoding, so the emulator never waits on it or
+shares the GIL with it; if the queue is full the frame is dropped and counted
+instead.
+"""
+
+from __future__ import print_function, division
+import multiprocessing
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from queue import Full
+
+
+def to_image(display_buffer, scale=1):
+    # display_buffer is indexed [x, y] with y = 0 at the bottom
+    image = display_buffer.T[::-1]
+    if scale > 1:
+        image = image.repeat(scale, axis=0).repeat(scale, axis=1)
+    return np.ascontiguousarray(image, dtype=np.uint8)
+
+
+# Encoders #
+# Each takes frames as (image, duration in seconds) once the duration is known
+class GifEncoder(object):
+    MIN_CODE_SIZE = 2 # Smallest allowed, plenty for a black and white palette
+    MAX_DURATION = 0xffff / 100 # Delays are 16-bit centiseconds
+
+    def __init__(self, filename, width, height):
+        self.file = open(filename, 'wb')
+        self.file.write(b'GIF89a')
+        # Global color table with 2 entries: black and white
+        self.file.write(struct.pack('<HHBBB', width, height, 0xf0, 0, 0))
+        self.file.write(b'\x00\x00\x00\xff\xff\xff')
+        # Loop forever
+        self.file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+        self.width = width
+        self.height = height
+
+    def write(self, image, duration):
+        delay = min(0xffff, max(1, int(round(duration * 100))))
+        self.file.write(struct.pack('<BBBBHBB', 0x21, 0xf9, 4, 0, delay, 0, 0))
+        self.file.write(struct.pack('<BHHHHB', 0x2c, 0, 0,
+            self.width, self.height, 0))
+
+        data = self._lzw(image.ravel().tobytes())
+        self.file.write(bytes((GifEncoder.MIN_CODE_SIZE,)))
+        for i in range(0, len(data), 255):
+            block = data[i:i + 255]
+            self.file.write(bytes((len(block),)) + block)
+        self.file.write(b'\x00')
+
+    def close(self):
+        self.file.write(b'\x3b')
+        self.file.close()
+
+    def _lzw(self, pixels):
+        clear = 1 << GifEncoder.MIN_CODE_SIZE
+        end = clear + 1
+        out = bytearray()
+        bits = 0
+        bit_count = 0
+
+        def emit(code, size):
+            nonlocal bits, bit_count
+            bits |= code << bit_count
+            bit_count += size
+            while bit_count >= 8:
+                out.append(bits & 0xff)
+                bits >>= 8
+                bit_count -= 8
+
+        # The decoder lags one table entry behind, hence next_code - 1
+        table = {}
+        next_code = end + 1
+        emit(clear, (next_code - 1).bit_length())
+
+        prefix = pixels[0]
+        for pixel in pixels[1:]:
+            code = table.get((prefix, pixel))
+            if code is not None:
+                prefix = code
+                continue
+
+            emit(prefix, (next_code - 1).bit_length())
+            table[prefix, pixel] = next_code
+            next_code += 1
+            if next_code == 0x1000:
+                emit(clear, 12)
+                table = {}
+                next_code = end + 1
+            prefix = pixel
+
+        emit(prefix, (next_code - 1).bit_length())
+        emit(end, min(12, next_code.bit_length()))
+        if bit_count:
+            out.append(bits & 0xff)
+        return bytes(out)
+
+
+class ApngEncoder(object):
+    MAX_DURATION = 0xffff / 1000 # Delays are 16-bit milliseconds
+
+    def __init__(self, filename, width, height):
+        self.file = open(filename, 'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        # 8-bit grayscale
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+        # Frame count isn't known until close, so remember where it goes
+        self.actl_offset = self.file.tell()
+        self._chunk(b'acTL', struct.pack('>II', 0, 0))
+        self.width = width
+        self.height = height
+        self.frames = 0
+        self.sequence = 0
+
+    def write(self, image, duration):
+        delay = min(0xffff, max(1, int(round(duration * 1000))))
+        self._chunk(b'fcTL', struct.pack('>IIIIIHHBB', self.sequence,
+            self.width, self.height, 0, 0, delay, 1000, 0, 0))
+        self.sequence += 1
+
+        # Each row starts with a filter byte of 0
+        rows = np.zeros((self.height, self.width + 1), dtype=np.uint8)
+        rows[:, 1:] = image * 0xff
+        data = zlib.compress(rows.tobytes())
+
+        if self.frames == 0:
+            self._chunk(b'IDAT', data)
+        else:
+            self._chunk(b'fdAT', struct.pack('>I', self.sequence) + data)
+            self.sequence += 1
+        self.frames += 1
+
+    def close(self):
+        self._chunk(b'IEND', b'')
+        self.file.seek(self.actl_offset)
+        self._chunk(b'acTL', struct.pack('>II', self.frames, 0))
+        self.file.close()
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind + data)
+        self.file.write(struct.pack('>I', zlib.crc32(kind + data)))
+
+
+class RawEncoder(object):
+    # Header: b'C8RL', width, height (u16)
+    # Frame:  duration in ms (u32), run count (u16), run lengths (u16 each).
+    #         Runs alternate between unset and set pixels, starting unset.
+    MAGIC = b'C8RL'
+    MAX_DURATION = 0xffffffff / 1000
+
+    def __init__(self, filename, width, height):
+        self.file = open(filename, 'wb')
+        self.file.write(RawEncoder.MAGIC + struct.pack('<HH', width, height))
+
+    def write(self, image, duration):
+        pixels = image.ravel()
+        changes = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+        runs = np.diff(np.concatenate(([0], changes, [len(pixels)])))
+        if pixels[0]:
+            runs = np.concatenate(([0], runs))
+
+        delay = min(0xffffffff, int(round(duration * 1000)))
+        self.file.write(struct.pack('<IH', delay, len(runs)))
+        self.file.write(runs.astype('<u2').tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def read_raw(filename):
+    # Yields (duration in ms, image) from a file written by RawEncoder
+    with open(filename, 'rb') as raw_file:
+        if raw_file.read(4) != RawEncoder.MAGIC:
+            raise ValueError('Not a raw frame recording')
+        width, height = struct.unpack('<HH', raw_file.read(4))
+
+        while True:
+            frame_header = raw_file.read(6)
+            if len(frame_header) < 6:
+                return
+            duration, run_count = struct.unpack('<IH', frame_header)
+            runs = np.frombuffer(raw_file.read(2 * run_count), dtype='<u2')
+            values = np.arange(run_count, dtype=np.uint8) & 1
+            yield duration, values.repeat(runs).reshape(height, width)
+
+
+ENCODERS = {
+    'gif': GifEncoder,
+    'apng': ApngEncoder,
+    'png': ApngEncoder,
+    'raw': RawEncoder,
+}
+
+
+def _write(encoder, image, duration):
+    # Frames held longer than the format can express are split up
+    while duration > encoder.MAX_DURATION:
+        encoder.write(image, encoder.MAX_DURATION)
+        duration -= encoder.MAX_DURATION
+    encoder.write(image, duration)
+
+
+def _encode(frames, filename, format, scale, written):
+    # Runs in the worker: skip repeated frames and encode the rest
+    encoder = None
+    pending = None
+    pending_time = None
+
+    try:
+        while True:
+            timestamp, frame = frames.get()
+
+            if frame is not None and pending is not None \
+                    and np.array_equal(frame, pending):
+                continue
+
+            # A new frame ends the pending one, so its duration is known now
+            if pending is not None:
+                image = to_image(pending, scale)
+                if encoder is None:
+                    height, width = image.shape
+                    encoder = ENCODERS[format](filename, width, height)
+                _write(encoder, image, timestamp - pending_time)
+                with written.get_lock():
+                    written.value += 1
+
+            if frame is None:
+                break
+            pending, pending_time = frame, timestamp
+    finally:
+        if encoder is not None:
+            encoder.close()
+
+
+class Recorder(object):
+    def __init__(self, filename, format=None, scale=4, queue_size=256):
+        if format is None:
+            format = filename.rsplit('.', 1)[-1].lower()
+        if format not in ENCODERS:
+            raise ValueError('Unknown recording format ' + format)
+
+        self.filename = filename
+        self.format = format
+        # Raw recordings are for tools, keep them at native resolution
+        self.scale = 1 if format == 'raw' else scale
+
+        self.pushed = 0
+        self.dropped = 0
+
+        # Encode in a forked process so it doesn't compete with the emulator
+        # for the GIL. Create the Recorder before any windows, audio players
+        # or threads exist, so the child doesn't inherit them. Without fork,
+        # fall back to a thread rather than re-running the caller's script in
+        # a spawned process.
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            worker = context.Process
+        else:
+            context = multiprocessing.get_context()
+            worker = threading.Thread
+
+        self.queue = context.Queue(maxsize=queue_size)
+        self.written = context.Value('L', 0)
+        self.worker = worker(target=_encode, name='Recorder', args=(self.queue,
+            filename, format, self.scale, self.written))
+        self.worker.daemon = True
+        self.worker.start()
+
+    def push(self, display_buffer):
+        # Called from the emulator thread, must never block
+        try:
+            self.queue.put_nowait((time.perf_counter(), display_buffer.copy()))
+            self.pushed += 1
+        except Full:
+            self.dropped += 1
+
+    def close(self):
+        stop = (time.perf_counter(), None)
+        # The worker may have died, so never wait on a full queue for it
+        while self.worker.is_alive():
+            try:
+                self.queue.put(stop, timeout=0.1)
+                break
+            except Full:
+                pass
+        self.worker.join()
+
+        # Anything left over has nobody to read it
+        self.queue.close()
+        self.queue.cancel_join_thread()
+
+    def report(self):
+        return "Recorded {written} frames from {pushed} ({dropped} dropped) to {filename}".format(
+                written=self.written.value,
+                pushed=self.pushed,
+                dropped=self.dropped,
+                filename=self.filename)
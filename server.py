@@ -0,0 +1,252 @@
+"""
+Remote debug server for one or more emulator instances
+
+Serves the debugger commands over a local TCP or Unix socket with asyncio.
+Each request is one line of text, much like the debugger prompt:
+
+    u <instance>        - Use an instance for the rest of the connection
+    l                   - List instances
+    s [count]           - Step forward count instructions (default 1)
+    b <addr>            - Set breakpoint at addr
+    r <breakpoint num>  - Remove breakpoint
+    c                   - Continue to next breakpoint
+    f                   - Continue to next frame update
+    z                   - Pause a running instance
+    k <key> <0|1>       - Release or press a key
+    p m <start>+<len>   - Read memory (binary)
+    p r [reg]           - Read registers (binary)
+    p k                 - Read key buffer (binary)
+    p i / p s / p b     - Print index register, stack or breakpoints
+    d                   - Read the display, packed one bit per pixel from the
+                          top row down (binary)
+
+Every response is a status line, 'OK <length>' or 'ERR <length>', followed by
+exactly length bytes of payload. If an instance crashes while running, the
+requests waiting on it get an ERR saying where it halted.
+
+Instances run in batches of cycles between protocol events, so continuing or
+stepping doesn't stop the server from answering other clients.
+"""
+
+from __future__ import print_function, division
+import asyncio
+import argparse
+import numpy as np
+from chip import Chip
+
+
+class Halted(Exception):
+    pass
+
+
+class Instance(object):
+    def __init__(self, name, emu, slice_size=2000):
+        self.name = name
+        self.emu = emu
+        self.slice_size = slice_size
+        self.breakpoints = {}
+        self.last_breakpoint = 0
+
+        self.task = None
+        self.stopped = None
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def instruction(self):
+        if not 0 <= self.emu.pc < len(self.emu.memory) - 1:
+            return "0x{0:04x} outside memory".format(int(self.emu.pc))
+
+        opcode = int(self.emu.memory[self.emu.pc]) << 8
+        opcode |= int(self.emu.memory[self.emu.pc + 1])
+        instruction = self.emu.opcode_map.get(opcode)
+        return "0x{0:04x} 0x{1:04x} {2}".format(int(self.emu.pc), opcode,
+                instruction.__name__ if instruction else 'unknown')
+
+    def resume(self, until_frame=False, count=None):
+        # Returns a future resolved with the instruction where it stopped.
+        # With a count it steps that many instructions, ignoring breakpoints.
+        if not self.running:
+            self.stopped = asyncio.get_running_loop().create_future()
+            self.task = asyncio.ensure_future(self._run(until_frame, count))
+        return self.stopped
+
+    def pause(self):
+        if self.running:
+            self.task.cancel()
+
+    async def _run(self, until_frame, count):
+        emu = self.emu
+        emu.should_draw = False
+        try:
+            while count is None or count > 0:
+                if count is None:
+                    addresses = set(self.breakpoints.values())
+                    batch = self.slice_size
+                else:
+                    addresses = ()
+                    batch = min(self.slice_size, count)
+                    count -= batch
+
+                for _ in range(batch):
+                    emu.cycle()
+                    if emu.pc in addresses or (until_frame and emu.should_draw):
+                        return
+                # Let the server handle requests between slices
+                await asyncio.sleep(0)
+        except Exception as error:
+            self.stopped.set_exception(Halted("{0} at {1}".format(
+                repr(error), self.instruction())))
+        finally:
+            if not self.stopped.done():
+                self.stopped.set_result(self.instruction())
+
+
+class DebugServer(object):
+    def __init__(self, instances):
+        self.instances = instances
+
+    async def handle(self, reader, writer):
+        instance = self.instances[0]
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            cmd = line.decode(errors='replace').split()
+            if not cmd:
+                continue
+
+            try:
+                if cmd[0] == 'u':
+                    instance = self.instances[int(cmd[1])]
+                    payload = instance.name
+                else:
+                    payload = await self.process_command(instance, *cmd)
+                status = 'OK'
+            except (IndexError, KeyError, ValueError) as error:
+                status, payload = 'ERR', 'Invalid command {0}'.format(error)
+            except Halted as error:
+                status, payload = 'ERR', 'Halted: {0}'.format(error)
+
+            if isinstance(payload, str):
+                payload = payload.encode()
+            writer.write("{0} {1}\n".format(status, len(payload)).encode())
+            writer.write(payload)
+            await writer.drain()
+
+        writer.close()
+
+    async def process_command(self, instance, *cmd):
+        emu = instance.emu
+
+        if cmd[0] == 'l':
+            return "\n".join("{0} {1}{2}".format(i, inst.name,
+                    ' (running)' if inst.running else '')
+                for i, inst in enumerate(self.instances))
+
+        elif cmd[0] == 'c':
+            return await instance.resume()
+
+        elif cmd[0] == 'f':
+            return await instance.resume(until_frame=True)
+
+        elif cmd[0] == 'z':
+            if instance.running:
+                instance.pause()
+                return await instance.stopped
+            return instance.instruction()
+
+        elif cmd[0] == 'b':
+            instance.breakpoints[instance.last_breakpoint] = int(cmd[1], 16)
+            instance.last_breakpoint += 1
+            return str(instance.last_breakpoint - 1)
+
+        elif cmd[0] == 'r':
+            del instance.breakpoints[int(cmd[1])]
+            return ''
+
+        elif cmd[0] == 'k':
+            key, value = int(cmd[1], 0), int(cmd[2])
+            if not 0 <= key < len(emu.key_inputs) or value not in (0, 1):
+                raise ValueError('key must be 0-15 and value 0 or 1')
+            emu.key_inputs[key] = value
+            return ''
+
+        elif cmd[0] == 'p' and cmd[1] == 'b':
+            return "\n".join("{0} - {1:#06x}".format(i, addr)
+                for i, addr in instance.breakpoints.items())
+
+        # Everything below needs the instance to hold still
+        if instance.running:
+            raise ValueError('instance is running')
+
+        if cmd[0] == 's':
+            count = int(cmd[1], 0) if len(cmd) > 1 else 1
+            return await instance.resume(count=count)
+
+        elif cmd[0] == 'd':
+            image = emu.display_buffer.T[::-1]
+            return np.packbits(image, axis=1).tobytes()
+
+        elif cmd[0] == 'p':
+            if cmd[1] == 'm':
+                start, length = cmd[2].split('+')
+                start, length = int(start, 0), int(length, 0)
+                # Straight from the memory buffer, no copy
+                return emu.memory.data[start:start + length]
+
+            elif cmd[1] == 'r':
+                if len(cmd) > 2:
+                    reg = int(cmd[2], 0)
+                    return emu.registers.data[reg:reg + 1]
+                return emu.registers.data
+
+            elif cmd[1] == 'k':
+                return emu.key_inputs.data
+
+            elif cmd[1] == 'i':
+                return "0x{0:04x}".format(int(emu.index))
+
+            elif cmd[1] == 's':
+                return " ".join("0x{0:04x}".format(int(addr)) for addr in emu.stack)
+
+        raise ValueError(" ".join(cmd))
+
+
+async def serve(server, args):
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, path=args.unix)
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filenames', nargs='+', help='Locations of CHIP-8 ROMs')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8008)
+    parser.add_argument('--unix', help='Listen on a Unix socket at this path instead')
+    parser.add_argument('--slice', type=int, default=2000,
+            help='Instructions to run between protocol events')
+    args = parser.parse_args()
+
+    instances = []
+    for filename in args.filenames:
+        emu = Chip()
+        emu.load(filename)
+        instances.append(Instance(filename, emu, args.slice))
+
+    print("Serving {0} instance(s) on {1}".format(len(instances),
+        args.unix or "{0}:{1}".format(args.host, args.port)))
+    try:
+        asyncio.run(serve(DebugServer(instances), args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
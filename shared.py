@@ -0,0 +1,166 @@
+"""
+Export of the emulator state through shared memory
+
+The owning Chip's display_buffer and registers live directly in the segment,
+so publishing costs nothing beyond a sequence counter bump around each
+display write. At the end of each write the registers and other metadata are
+snapshotted into the header, so readers in other processes can use the
+counter like a seqlock to copy out frames that really existed.
+"""
+
+from __future__ import print_function, division
+import time
+import argparse
+import numpy as np
+from multiprocessing import shared_memory
+
+MAGIC = 0x38504843 # 'CHP8'
+
+HEADER = np.dtype([
+    ('magic', '<u4'),
+    ('width', '<u2'),
+    ('height', '<u2'),
+    ('seq', '<u8'),      # Odd while the display is being written
+    ('frame', '<u8'),    # Number of completed display writes
+    ('pc', '<u2'),
+    ('index', '<u2'),
+    ('delay_timer', 'u1'),
+    ('sound_timer', 'u1'),
+    ('padding', 'u1', (2,)),
+    ('frame_registers', 'u1', (16,)), # Registers as of the last frame
+    ('registers', 'u1', (16,))])      # Live, backing Chip.registers
+
+
+def _attach(name):
+    # Readers shouldn't unlink the segment when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # Before Python 3.13, skip registering with the resource tracker rather
+    # than unregistering afterwards. The tracker may be shared with the owner,
+    # and unregistering would drop the owner's registration too.
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedState(object):
+    def __init__(self, width, height, name=None, create=True):
+        size = HEADER.itemsize + width * height
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = _attach(name)
+
+        self.name = self.shm.name
+        self.owner = create
+        # Counters are kept as Python ints and stored, numpy 1.x won't add an
+        # int to a uint64 in place
+        self.seq = 0
+        self.frame = 0
+        self.header = np.ndarray((), dtype=HEADER, buffer=self.shm.buf)
+
+        if create:
+            self.header['magic'] = MAGIC
+            self.header['width'] = width
+            self.header['height'] = height
+        elif self.header['magic'] != MAGIC:
+            raise ValueError('Not a Chip-8 state segment')
+
+        self.registers = self.header['registers']
+        self.display_buffer = np.ndarray((width, height), dtype=np.uint8,
+                buffer=self.shm.buf, offset=HEADER.itemsize)
+
+    @classmethod
+    def attach(cls, name):
+        shm = _attach(name)
+        header = np.ndarray((), dtype=HEADER, buffer=shm.buf)
+        width, height = int(header['width']), int(header['height'])
+        del header
+        shm.close()
+        return cls(width, height, name=name, create=False)
+
+    # Writer side #
+    def begin_frame(self):
+        self.seq += 1
+        self.header['seq'] = self.seq
+
+    def end_frame(self, emu):
+        # Runs between instructions, so the registers are consistent here
+        self.frame += 1
+        self.header['frame'] = self.frame
+        self.header['frame_registers'] = emu.registers
+        self.header['pc'] = emu.pc
+        self.header['index'] = emu.index
+        self.header['delay_timer'] = emu.delay_timer
+        self.header['sound_timer'] = emu.sound_timer
+        self.seq += 1
+        self.header['seq'] = self.seq
+
+    # Reader side #
+    def read_frame(self, timeout=1.0):
+        # Returns (frame, display, registers, metadata) copied from one frame
+        deadline = time.monotonic() + timeout
+        delay = 0.0001
+        while True:
+            seq = int(self.header['seq'])
+            if not seq & 1:
+                header = self.header.copy()
+                display = self.display_buffer.copy()
+                if int(self.header['seq']) == seq:
+                    metadata = {field: int(header[field])
+                            for field in ('pc', 'index', 'delay_timer', 'sound_timer')}
+                    return (int(header['frame']), display,
+                            header['frame_registers'].copy(), metadata)
+
+            if time.monotonic() > deadline:
+                raise TimeoutError('Writer did not finish a frame')
+
+            # Mid-write, back off rather than spinning
+            time.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+    def close(self):
+        # Views must go before the buffer can be released
+        del self.header, self.registers, self.display_buffer
+        try:
+            self.shm.close()
+        finally:
+            if self.owner:
+                self.shm.unlink()
+
+
+def main():
+    # Minimal viewer that prints each new frame from a running instance
+    parser = argparse.ArgumentParser()
+    parser.add_argument('name', help='Name of the shared memory segment')
+    parser.add_argument('-i', '--interval', type=float, default=1/20.,
+            help='Polling interval in seconds')
+    args = parser.parse_args()
+
+    state = SharedState.attach(args.name)
+    last_frame = None
+    try:
+        while True:
+            frame, display, registers, metadata = state.read_frame()
+            if frame != last_frame:
+                last_frame = frame
+                print("Frame {0} - PC: 0x{1:04x}".format(frame, metadata['pc']))
+                print("Registers", registers)
+                for y in range(display.shape[1] - 1, -1, -1):
+                    print("".join("▓" if display[x, y] else "░"
+                        for x in range(display.shape[0])))
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state.close()
+
+if __name__ == '__main__':
+    main()
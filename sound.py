@@ -0,0 +1,258 @@
+"""
+Sound output for the Chip-8 buzzer
+
+The buzzer only ever plays one tone, so the waveform is built once up front
+and streamed out of a ring buffer by slicing. The emulator only talks to the
+Beeper when the sound timer is set or runs out.
+
+The timers here count down once per instruction rather than at 60Hz, so the
+emulator asks for a minimum tone length of timer / 60 seconds and the Beeper
+keeps playing that long even after the timer has run out.
+"""
+
+from __future__ import print_function, division
+import threading
+import time
+import wave
+import numpy as np
+
+
+SAMPLE_RATE = 44100
+
+
+def square_wave(frequency, sample_rate=SAMPLE_RATE, volume=0.25):
+    # A single period, so the buffer loops without a click
+    period = max(2, int(round(sample_rate / frequency)))
+    amplitude = int(volume * 0x7fff)
+
+    waveform = np.full(period, -amplitude, dtype=np.int16)
+    waveform[:period // 2] = amplitude
+    return waveform
+
+
+class RingBuffer(object):
+    def __init__(self, capacity):
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.read_pos = 0
+        self.size = 0
+
+    def free(self):
+        return self.capacity - self.size
+
+    def write(self, samples):
+        count = min(len(samples), self.free())
+        start = (self.read_pos + self.size) % self.capacity
+        first = min(count, self.capacity - start)
+
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:count - first] = samples[first:count]
+        self.size += count
+        return count
+
+    def read(self, count):
+        count = min(count, self.size)
+        first = min(count, self.capacity - self.read_pos)
+
+        samples = np.concatenate((
+            self.buffer[self.read_pos:self.read_pos + first],
+            self.buffer[:count - first]))
+        self.read_pos = (self.read_pos + count) % self.capacity
+        self.size -= count
+        return samples
+
+
+class Beeper(object):
+    def __init__(self, sink, frequency=440, volume=0.25, buffer_size=1024):
+        self.sink = sink
+        self.sample_rate = sink.sample_rate
+        self.waveform = square_wave(frequency, self.sample_rate, volume)
+
+        # Tile the period so any refill of the ring is one contiguous slice
+        period = len(self.waveform)
+        self.loop = np.tile(self.waveform, buffer_size // period + 2)
+        self.ring = RingBuffer(buffer_size)
+        self.phase = 0
+
+        # The ring is only touched by read(), which may run on the audio
+        # thread. The lock covers the state shared with start() and stop().
+        self.lock = threading.Lock()
+        self.playing = False
+        self.remaining = 0
+        self.started_at = None
+
+        # Measurements for the headless sinks
+        self.transitions = 0
+        self.samples_played = 0
+        self.latencies = []
+        self.overhead = 0.0
+
+    def start(self, duration=0):
+        # The tone lasts at least duration seconds, even if stop() comes first
+        began = time.perf_counter()
+        with self.lock:
+            self.remaining = max(self.remaining, int(duration * self.sample_rate))
+            if self.playing:
+                return
+            self.playing = True
+            self.started_at = began
+            self.transitions += 1
+
+        self.sink.play(self)
+        self.overhead += time.perf_counter() - began
+
+    def stop(self):
+        if not self.playing:
+            return
+
+        began = time.perf_counter()
+        # Sinks may still pull the rest of the tone while it counts as playing
+        self.sink.pause(self)
+        with self.lock:
+            self.playing = False
+            self.transitions += 1
+        self.overhead += time.perf_counter() - began
+
+    def read(self, count):
+        # Called by the sink to pull the next count samples
+        began = time.perf_counter()
+        samples = np.zeros(count, dtype=np.int16)
+
+        with self.lock:
+            tone = count if self.playing else min(count, self.remaining)
+            self.remaining = max(0, self.remaining - count)
+
+            filled = 0
+            while filled < tone:
+                if self.ring.size == 0:
+                    self._refill()
+                chunk = self.ring.read(tone - filled)
+                samples[filled:filled + len(chunk)] = chunk
+                filled += len(chunk)
+
+            if tone and self.started_at is not None:
+                self.latencies.append(time.perf_counter() - self.started_at)
+                self.started_at = None
+            self.samples_played += tone
+            self.overhead += time.perf_counter() - began
+
+        return samples
+
+    def _refill(self):
+        period = len(self.waveform)
+        count = self.ring.free()
+        self.ring.write(self.loop[self.phase:self.phase + count])
+        self.phase = (self.phase + count) % period
+
+    def close(self):
+        self.stop()
+        self.sink.close()
+
+    def report(self):
+        latency = max(self.latencies) if self.latencies else 0.0
+        return ("Sound: {transitions} transitions, {seconds:.2f}s of tone, "
+                "worst latency {latency:.3f}ms, overhead {overhead:.3f}ms").format(
+                        transitions=self.transitions,
+                        seconds=self.samples_played / self.sample_rate,
+                        latency=latency * 1000,
+                        overhead=self.overhead * 1000)
+
+
+# Sinks #
+class NullSink(object):
+    # Discards everything, for headless runs and measuring overhead
+    def __init__(self, sample_rate=SAMPLE_RATE, block_size=256):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.resumed_at = None
+        self.played = 0
+
+    def play(self, source):
+        # Prime one block like a real device would, then account for the
+        # rest in bulk once the tone stops
+        self.resumed_at = time.perf_counter()
+        self.consume(source.read(self.block_size))
+
+    def pause(self, source):
+        # Whichever is longer, the time it played or its minimum length
+        elapsed = time.perf_counter() - self.resumed_at
+        count = max(int(elapsed * self.sample_rate) - self.block_size,
+                source.remaining)
+        if count > 0:
+            self.consume(source.read(count))
+        self.played = self.block_size + max(count, 0)
+
+    def consume(self, samples):
+        pass
+
+    def close(self):
+        pass
+
+
+class WaveSink(NullSink):
+    # Writes the session's audio, silence included, to a mono 16-bit WAV
+    def __init__(self, filename, sample_rate=SAMPLE_RATE, block_size=256):
+        super(WaveSink, self).__init__(sample_rate, block_size)
+        self.file = wave.open(filename, 'wb')
+        self.file.setnchannels(1)
+        self.file.setsampwidth(2)
+        self.file.setframerate(sample_rate)
+        self.paused_at = time.perf_counter()
+
+    def play(self, source):
+        silence = int((time.perf_counter() - self.paused_at) * self.sample_rate)
+        self.consume(np.zeros(max(0, silence), dtype=np.int16))
+        super(WaveSink, self).play(source)
+
+    def pause(self, source):
+        super(WaveSink, self).pause(source)
+        # The tone may have been written past the current time
+        self.paused_at = max(time.perf_counter(),
+                self.resumed_at + self.played / self.sample_rate)
+
+    def consume(self, samples):
+        self.file.writeframes(samples.astype('<i2').tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+class PygletSink(object):
+    # Streams through pyglet.media; the player pulls from the Beeper. It keeps
+    # running and plays silence between beeps, so the tone can run out its
+    # minimum length and restarting costs nothing.
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        import pyglet.media
+        from pyglet.media.codecs import AudioData, AudioFormat
+
+        self.sample_rate = sample_rate
+        self.player = pyglet.media.Player()
+        sink = self
+
+        class BeeperSource(pyglet.media.StreamingSource):
+            def __init__(self):
+                self.audio_format = AudioFormat(
+                        channels=1, sample_size=16, sample_rate=sample_rate)
+                self.source = None
+
+            def get_audio_data(self, num_bytes, compensation_time=0.0):
+                count = num_bytes // 2
+                data = self.source.read(count).astype('<i2').tobytes()
+                return AudioData(data, len(data), 0.0,
+                        count / sink.sample_rate, [])
+
+        self.stream = BeeperSource()
+        self.queued = False
+
+    def play(self, source):
+        if not self.queued:
+            self.stream.source = source
+            self.player.queue(self.stream)
+            self.player.play()
+            self.queued = True
+
+    def pause(self, source):
+        pass
+
+    def close(self):
+        self.player.delete()